@@ -0,0 +1,26 @@
+"""
+Ahead-of-time compile the tokenizer kernel so workers skip the jit warmup.
+
+    python build_kernels.py
+
+writes fungicide_kernels.*.so next to this file, which tokenizer.py imports
+in place of the jit-compiled kernel when it is present.
+"""
+import os
+
+from numba.pycc import CC
+
+from tokenizer import _scan_tokens
+
+
+cc = CC('fungicide_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@cc.export('scan_tokens', 'UniTuple(int64[:], 2)(uint8[::1])')
+def scan_tokens(buf):
+    return _scan_tokens(buf)
+
+
+if __name__ == "__main__":
+    cc.compile()
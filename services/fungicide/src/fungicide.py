@@ -1,26 +1,53 @@
-import json
+import asyncio
 import os
 import re
-from urllib.parse import urlparse
-from dataclasses import dataclass, is_dataclass, asdict, fields
+from dataclasses import dataclass, field
 from typing import cast, Any
 
 from dotenv import load_dotenv
 
-import redis
+import redis.asyncio as redis
+from redis.asyncio.retry import Retry
 from redis.backoff import ExponentialBackoff
-from redis.retry import Retry
+from redis.commands.core import AsyncScript
 
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+import orjson
+import xxhash
+from cachetools import LRUCache
+from scipy.sparse import csr_matrix
+from scipy.special import expit
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
 
+from tokenizer import ngrams, tokenize
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o: object):
-        if is_dataclass(o):
-            return asdict(o)
-        return super().default(o)
+
+# network location of an absolute url
+_NETLOC_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://([^/?#]+)')
+
+# pop up to ARGV[1] pages from the KEYS[1] queue, dropping pages whose domain
+# is already in the KEYS[2] blacklist. returns the number of pages popped
+# followed by the pages that were kept.
+_POP_BATCH_SCRIPT = """
+local values = redis.call('LPOP', KEYS[1], ARGV[1])
+if not values then
+    return {0}
+end
+
+local result = {#values}
+for _, value in ipairs(values) do
+    local domain = string.match(value, '"location"%s*:%s*"%a[%w+.-]*://([^/?#"]+)')
+    if not domain or redis.call('SISMEMBER', KEYS[2], domain) == 0 then
+        table.insert(result, value)
+    end
+end
+return result
+"""
 
 
 @dataclass
@@ -52,40 +79,42 @@ class Page(object):
     script_content: list[str]
     location:       str
 
-    def tokenize(self):
+    # prose fields fed to the classifier. urls (links, script_links and
+    # location) only inflate the tf-idf input, so they are left out.
+    _TEXT_FIELDS = (
+        "title", "description", "author", "keywords", "headings", "content",
+        "script_content",
+    )
+
+    def tokenize(self) -> list[str]:
         """
-        Tokenize page content into a single string.
+        Tokenize page content into a list of words.
         """
-        text_to_tokenize = []
-        for field in fields(self):
-            value = getattr(self, field.name)
+        parts = []
+        for name in self._TEXT_FIELDS:
+            value = self.__dict__[name]
             if value:
-                if isinstance(value, list):
-                    text_to_tokenize.extend(value)
-                elif isinstance(value, str):
-                    text_to_tokenize.append(value)
+                parts.append(" ".join(value) if isinstance(value, list) else value)
 
-        combined_text = " ".join(text_to_tokenize)
-        raw = re.findall(r'\b\w+\b', combined_text.lower())
-        tokens = [t for t in raw if all(c.isascii() and c.isalpha() for c in t) and len(t) > 3]
-        return " ".join(tokens)
+        return tokenize(" ".join(parts))
 
     @staticmethod
     def as_page(map: dict[str, Any]) -> 'Page':
         """
         Convert a dictionary into a page object.
         """
+        get = map.get
         return Page(
-            title=map.get("title", ""),
-            description=map.get("description", ""),
-            author=map.get("author", ""),
-            keywords=map.get("keywords", []),
-            headings=map.get("headings", []),
-            content=map.get("content", []),
-            links=map.get("links", []),
-            script_links=map.get("script_links", []),
-            script_content=map.get("script_content", []),
-            location=map.get("location", ""),
+            get("title", ""),
+            get("description", ""),
+            get("author", ""),
+            get("keywords", []),
+            get("headings", []),
+            get("content", []),
+            get("links", []),
+            get("script_links", []),
+            get("script_content", []),
+            get("location", ""),
         )
 
 
@@ -100,70 +129,193 @@ class App:
 
     # webpage classifier
     clf: LogisticRegression
-    vectorizer: TfidfVectorizer
+    vectorizer: TfidfVectorizer | Pipeline
     rejection_threshold: float
-
-    def run(self):
+    batch_size: int = 64
+
+    # classifier output keyed by the hash of the raw queue message, so pages
+    # that are delivered again skip tokenization and inference
+    cache: LRUCache = field(default_factory=lambda: LRUCache(maxsize=65536))
+
+    # fitted vectorizer state, used to build tf-idf rows from tokenized pages
+    # without going through the vectorizer's analyzer pipeline. hashing
+    # pipelines have no vocabulary; their n-grams are hashed with a feature
+    # hasher matching the pipeline's and weighted by its tf-idf transformer.
+    vocabulary: dict[str, int] | None = field(init=False)
+    stop_words: frozenset[str] = field(init=False)
+    ngram_range: tuple[int, int] = field(init=False)
+    idf: np.ndarray = field(init=False)
+    hasher: FeatureHasher | None = field(init=False, default=None)
+    tfidf: TfidfTransformer | None = field(init=False, default=None)
+
+    # logistic regression parameters, used to score batches directly rather
+    # than going through predict_proba's validation and dispatch
+    weights: np.ndarray = field(init=False)
+    intercept: float = field(init=False)
+
+    pop_batch: AsyncScript = field(init=False)
+
+    def __post_init__(self):
+        self.pop_batch = self.redis_client.register_script(_POP_BATCH_SCRIPT)
+
+        # float32 throughout so scoring is a float32 spmv end to end
+        self.vocabulary = getattr(self.vectorizer, "vocabulary_", None)
+        if self.vocabulary is not None:
+            self.stop_words = frozenset(self.vectorizer.get_stop_words() or ())
+            self.ngram_range = self.vectorizer.ngram_range
+            self.idf = self.vectorizer.idf_.astype(np.float32, copy=False)
+        else:
+            hasher, self.tfidf = self.vectorizer[0], self.vectorizer[-1]
+            self.stop_words = frozenset(hasher.get_stop_words() or ())
+            self.ngram_range = hasher.ngram_range
+            self.hasher = FeatureHasher(
+                n_features=hasher.n_features,
+                input_type="string",
+                alternate_sign=hasher.alternate_sign,
+            )
+        self.weights = self.clf.coef_[0].astype(np.float32, copy=False)
+        self.intercept = float(self.clf.intercept_[0])
+
+    async def run(self):
         """
-        Continually poll the redis queue for pages and process them.
+        Continually poll the redis queue for batches of pages and process them.
+        The next batch is fetched while the current one is being processed.
         """
+        batch = await self.wait_for_batch(self.batch_size)
         while True:
-            page = self.wait_for_page()
-            not_dev_proba, _ = self.classify(page)
+            batch, _ = await asyncio.gather(
+                self.wait_for_batch(self.batch_size),
+                self.process_batch(*batch),
+            )
+
+    async def process_batch(self, keys: list[int], pages: list[Page]):
+        """
+        Classify a batch of pages and route each one to its destination queue.
+        """
+        # run the classifier off the event loop so pending redis i/o proceeds
+        loop = asyncio.get_running_loop()
+        probas = await loop.run_in_executor(None, self.classify, pages, keys)
 
+        accepted, outlinks, domains = [], [], set()
+        for page, (not_dev_proba, _) in zip(pages, probas):
             if not_dev_proba >= self.rejection_threshold:
-                self.blacklist(page)
+                domains.add(self.domain(page))
                 print("BLOCK", int(not_dev_proba * 100), page.location)
                 continue
 
+            outlinks.extend(self.outlinks(page))
             if not_dev_proba <= 0.5:
-                self.push_page(page)
-                self.push_outlinks(page)
+                accepted.append(page)
                 print("PUSH1", int(not_dev_proba * 100), page.location)
             else:
-                self.push_outlinks(page)
                 print("PUSH2", int(not_dev_proba * 100), page.location)
 
-    def wait_for_page(self, timeout=0) -> Page:
+        await self.push(accepted, outlinks, domains)
+
+    async def wait_for_batch(self, max_n=64, timeout=0) -> tuple[list[int], list[Page]]:
         """
-        Wait for a page from the redis queue.
+        Wait for up to max_n pages from the redis queue. Pages from domains
+        that are already blacklisted are dropped server side before they reach
+        the classifier. Returns the hash of each raw message alongside the
+        decoded pages.
         """
-        raw = self.redis_client.blpop([self.fungicide_queue_key], timeout)
-        _, value = cast(tuple[str, str], raw)
-        return json.loads(value, object_hook = Page.as_page)
-
-    def push_outlinks(self, page: Page):
+        queue_keys = [self.fungicide_queue_key, self.mycelium_blacklist_key]
+        while True:
+            popped, *values = cast(list, await self.pop_batch(keys=queue_keys, args=[max_n]))
+            if values:
+                break
+            if not popped:
+                # rotating the head of the queue onto itself blocks until a
+                # page arrives without consuming it
+                await self.redis_client.blmove(
+                    self.fungicide_queue_key, self.fungicide_queue_key, timeout, "LEFT", "LEFT"
+                )
+
+        keys = [xxhash.xxh3_64_intdigest(value) for value in values]
+        pages = [Page.as_page(orjson.loads(value)) for value in values]
+        return keys, pages
+
+    def outlinks(self, page: Page) -> list[bytes]:
         """
-        Also push the page outlinks to the crawler's ingest queue.
+        Serialize the page outlinks for the crawler's ingest queue.
         """
-        s_to_outlink = lambda s: json.dumps(Outlink(location=s, retries=0),
-                                            cls=EnhancedJSONEncoder)
-        outlinks = [s_to_outlink(link) for link in (page.links or [])]
+        return [orjson.dumps(Outlink(location=link, retries=0)) for link in (page.links or [])]
 
-        if len(outlinks) > 0:
-            self.redis_client.rpush(self.mycelium_queue_key, *outlinks)
-
-    def push_page(self, page: Page):
+    def domain(self, page: Page) -> str:
         """
-        Push a page to the redis output queue.
+        Get the domain of a page for the redis blacklist.
         """
-        self.redis_client.rpush(self.taxonomist_queue_key, json.dumps(page, cls=EnhancedJSONEncoder))
+        match = _NETLOC_RE.match(page.location)
+        return match.group(1) if match else ""
 
-    def blacklist(self, page: Page):
+    async def push(self, pages: list[Page], outlinks: list[bytes], domains: set[str]):
         """
-        Add a page's domain to the redis blacklist.
+        Push accepted pages to the redis output queue, outlinks to the
+        crawler's ingest queue and domains to the blacklist in a single
+        pipelined round-trip.
         """
-        domain = urlparse(page.location).netloc
-        self.redis_client.sadd(self.mycelium_blacklist_key, domain)
-
-    def classify(self, page: Page) -> tuple[float, float]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        if pages:
+            pipe.rpush(self.taxonomist_queue_key, *[orjson.dumps(page) for page in pages])
+        if outlinks:
+            pipe.rpush(self.mycelium_queue_key, *outlinks)
+        if domains:
+            pipe.sadd(self.mycelium_blacklist_key, *domains)
+        await pipe.execute()
+
+    def transform(self, documents: list[list[str]]) -> csr_matrix:
         """
-        Classify a page. Returns confidence from 0-1 if page is not a dev blog
-        and if a page is a dev blog respectively.
+        Turn tokenized documents into l2 normalized tf-idf rows. Equivalent to
+        the fitted vectorizer's transform, which would otherwise re-run its
+        preprocessing and token pattern over text that is already tokenized.
         """
-        text = page.tokenize()
-        matrix = self.vectorizer.transform([text])
-        return self.clf.predict_proba(matrix)[0]
+        stop_words, ngram_range = self.stop_words, self.ngram_range
+        if self.vocabulary is None:
+            counts = self.hasher.transform(
+                ngrams(document, stop_words, ngram_range) for document in documents
+            )
+            return self.tfidf.transform(counts).astype(np.float32)
+
+        vocabulary = self.vocabulary
+        indptr, indices, counts = [0], [], []
+        for document in documents:
+            row: dict[int, int] = {}
+            for gram in ngrams(document, stop_words, ngram_range):
+                j = vocabulary.get(gram)
+                if j is not None:
+                    row[j] = row.get(j, 0) + 1
+            indices.extend(row)
+            counts.extend(row.values())
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int32)
+        data = np.asarray(counts, dtype=np.float32) * self.idf[indices]
+        matrix = csr_matrix((data, indices, indptr), shape=(len(documents), len(self.idf)))
+        return normalize(matrix, copy=False)
+
+    def classify(self, pages: list[Page], keys: list[int]) -> np.ndarray:
+        """
+        Classify a batch of pages. Returns one row per page holding confidence
+        from 0-1 if page is not a dev blog and if a page is a dev blog
+        respectively. Only pages missing from the cache are run through the
+        classifier.
+        """
+        probas = np.empty((len(pages), 2))
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is None:
+                misses.append(i)
+            else:
+                probas[i] = cached
+
+        if misses:
+            matrix = self.transform([pages[i].tokenize() for i in misses])
+            dev_probas = expit(matrix.dot(self.weights) + self.intercept)
+            for i, dev_proba in zip(misses, dev_probas.tolist()):
+                probas[i] = self.cache[keys[i]] = (1.0 - dev_proba, dev_proba)
+
+        return probas
 
 
 def init_app() -> App:
@@ -181,20 +333,23 @@ def init_app() -> App:
     model_file             = os.getenv('MODEL_FILE', '')
     vectorizer_file        = os.getenv('VECTORIZER_FILE', '')
     rejection_threshold    = os.getenv('REJECTION_THRESHOLD', '')
+    batch_size             = os.getenv('BATCH_SIZE', '64')
 
     # create redis client
     retry = Retry(ExponentialBackoff(), int(redis_max_retries))
     client = redis.Redis(
         host=redis_host,
         port=int(redis_port),
-        decode_responses=True,
+        decode_responses=False,
         retry=retry,
     )
 
-    # load model and vectorizer
+    # load model and vectorizer. arrays are memory-mapped so that workers on
+    # the same host share one copy through the page cache.
     clf, vectorizer = None, None
     if os.path.isfile(model_file) and os.path.isfile(vectorizer_file):
-        clf, vectorizer = joblib.load(model_file), joblib.load(vectorizer_file)
+        clf = joblib.load(model_file, mmap_mode='r')
+        vectorizer = joblib.load(vectorizer_file, mmap_mode='r')
     else:
         raise FileNotFoundError("failed to load model or vectorizer")
 
@@ -207,6 +362,7 @@ def init_app() -> App:
         clf=clf,
         vectorizer=vectorizer,
         rejection_threshold=int(rejection_threshold) / 100.0,
+        batch_size=int(batch_size),
     )
 
     print("successfully initialized app")
@@ -216,7 +372,7 @@ def init_app() -> App:
 def main():
     app = init_app()
     print("app started. waiting for input...")
-    app.run()
+    asyncio.run(app.run())
 
 
 if __name__ == "__main__":
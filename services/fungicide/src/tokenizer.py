@@ -0,0 +1,156 @@
+import re
+
+import numpy as np
+from numba import njit
+
+
+# non-ascii characters that cannot be part of a word. these are blanked out
+# before scanning so every remaining non-ascii byte belongs to a word.
+_NON_ASCII_SEPARATOR_RE = re.compile(r'[^\x00-\x7f\w]')
+
+
+_HIGH_BITS = np.uint64(0x8080808080808080)
+_LOW_BITS  = np.uint64(0x7f7f7f7f7f7f7f7f)
+_CASE_BITS = np.uint64(0x2020202020202020)
+_ONES      = np.uint64(0x0101010101010101)
+_ONE       = np.uint64(1)
+_ZERO      = np.uint64(0)
+
+
+@njit(cache=True)
+def _is_word_byte(c: int) -> bool:
+    return (0x61 <= (c | 0x20) <= 0x7a) or (0x30 <= c <= 0x39) or c == 0x5f or c >= 0x80
+
+
+@njit(cache=True)
+def _swar_in_range(w: np.uint64, lo: int, hi: int) -> np.uint64:
+    """
+    Set the high bit of every byte of w that lies within [lo, hi]. The bytes
+    of w must be 7-bit and 1 <= lo <= hi < 0x7f so no carry crosses a byte.
+    """
+    above_lo = w + np.uint64(0x80 - lo) * _ONES
+    above_hi = w + np.uint64(0x7f - hi) * _ONES
+    return above_lo & ~above_hi & _HIGH_BITS
+
+
+@njit(cache=True)
+def _swar_classify(w: np.uint64) -> tuple[np.uint64, np.uint64]:
+    """
+    Classify 8 bytes at once. Returns masks with the high bit of each byte set
+    where the byte is a word character and a lowercase ascii letter.
+    """
+    high = w & _HIGH_BITS
+    low = w & _LOW_BITS
+    letters = _swar_in_range(low, 0x61, 0x7a) & ~high
+    words = (
+        _swar_in_range(low | _CASE_BITS, 0x61, 0x7a)
+        | _swar_in_range(low, 0x30, 0x39)
+        | _swar_in_range(low, 0x5f, 0x5f)
+        | high
+    )
+    return words, letters
+
+
+@njit(cache=True, nogil=True)
+def _scan_tokens(buf: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scan a lowercased utf-8 buffer for whole words made only of ascii letters
+    and longer than three characters. Returns token offsets and lengths.
+
+    Bytes are classified 8 at a time as little-endian words; blocks of pure
+    separators or pure letters are skipped without visiting each byte.
+    """
+    n = buf.shape[0]
+    n_blocks = n - n % 8
+    blocks = buf[:n_blocks].view(np.uint64)
+    offsets = np.empty(n // 5 + 1, dtype=np.int64)
+    lengths = np.empty(n // 5 + 1, dtype=np.int64)
+    count = 0
+
+    # start of the word being scanned, or -1 between words
+    start, letters_only = -1, True
+    word_mask, letter_mask = _ZERO, _ZERO
+
+    i = 0
+    while i < n:
+        if i < n_blocks:
+            if i & 7 == 0:
+                word_mask, letter_mask = _swar_classify(blocks[i >> 3])
+                if word_mask == _ZERO and start < 0:
+                    i += 8
+                    continue
+                if letter_mask == _HIGH_BITS:
+                    if start < 0:
+                        start, letters_only = i, True
+                    i += 8
+                    continue
+
+            shift = np.uint64(((i & 7) << 3) + 7)
+            is_word = (word_mask >> shift) & _ONE != _ZERO
+            is_letter = (letter_mask >> shift) & _ONE != _ZERO
+        else:
+            is_word = _is_word_byte(buf[i])
+            is_letter = 0x61 <= buf[i] <= 0x7a
+
+        if is_word:
+            if start < 0:
+                start, letters_only = i, True
+            if not is_letter:
+                letters_only = False
+        elif start >= 0:
+            if letters_only and i - start > 3:
+                offsets[count] = start
+                lengths[count] = i - start
+                count += 1
+            start = -1
+        i += 1
+
+    if start >= 0 and letters_only and n - start > 3:
+        offsets[count] = start
+        lengths[count] = n - start
+        count += 1
+
+    return offsets[:count], lengths[:count]
+
+
+# prefer the ahead-of-time compiled kernel from build_kernels.py when it has
+# been built, so new processes do not pay for jit compilation
+try:
+    from fungicide_kernels import scan_tokens
+except ImportError:
+    scan_tokens = _scan_tokens
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into its lowercased whole words made only of ascii letters and
+    longer than three characters.
+    """
+    text = text.lower()
+    ascii_only = text.isascii()
+    if not ascii_only:
+        text = _NON_ASCII_SEPARATOR_RE.sub(" ", text)
+
+    buf = text.encode()
+    offsets, lengths = scan_tokens(np.frombuffer(buf, dtype=np.uint8))
+    spans = zip(offsets.tolist(), lengths.tolist())
+
+    # byte offsets are character offsets when the text is pure ascii
+    if ascii_only:
+        return [text[o:o + l] for o, l in spans]
+    return [buf[o:o + l].decode() for o, l in spans]
+
+
+def ngrams(tokens: list[str], stop_words: frozenset[str], ngram_range: tuple[int, int]) -> list[str]:
+    """
+    Build the word n-grams of a tokenized document the way sklearn's word
+    analyzer does: stop words are dropped first, then each run of n tokens is
+    joined with a space.
+    """
+    tokens = [t for t in tokens if t not in stop_words]
+    min_n, max_n = ngram_range
+
+    grams = []
+    for n in range(min_n, max_n + 1):
+        grams.extend(tokens if n == 1 else map(" ".join, zip(*[tokens[k:] for k in range(n)])))
+    return grams
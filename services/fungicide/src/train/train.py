@@ -1,22 +1,27 @@
 import os
-import re
-import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+import orjson
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+from sklearn.pipeline import make_pipeline
 from sklearn.feature_extraction import text
 
-
-def tokenize(text):
-    raw_tokens = re.findall(r'\b\w+\b', text.lower())
-    return [t for t in raw_tokens if all(c.isascii() and c.isalpha() for c in t) and len(t) > 3]
+# share the page tokenizer with the fungicide service
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tokenizer import ngrams, tokenize
 
 
 def process_json_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(file_path, 'rb') as f:
+        data = orjson.loads(f.read())
     text_to_tokenize = []
     for field in ['title', 'description', 'keywords', 'headings', 'content']:
         if field in data:
@@ -25,42 +30,65 @@ def process_json_file(file_path):
             elif isinstance(data[field], str):
                 text_to_tokenize.append(data[field])
     combined_text = " ".join(text_to_tokenize)
-    return " ".join(tokenize(combined_text))
+    return tokenize(combined_text)
+
+
+def count_ngrams(documents, hasher):
+    """
+    Hash the n-grams of tokenized documents into the hasher's feature space.
+    The fungicide service builds its rows the same way, so the token lists
+    are never joined and re-tokenized by sklearn's analyzer.
+    """
+    feature_hasher = FeatureHasher(
+        n_features=hasher.n_features,
+        input_type="string",
+        alternate_sign=hasher.alternate_sign,
+    )
+    stop_words = frozenset(hasher.get_stop_words() or ())
+    return feature_hasher.transform(
+        ngrams(document, stop_words, hasher.ngram_range) for document in documents
+    )
 
 
 def load_dataset(folder, label):
-    texts, labels = [], []
+    file_paths = []
     for domain_folder in os.listdir(folder):
         domain_path = os.path.join(folder, domain_folder)
         if not os.path.isdir(domain_path):
             continue
         for file_name in os.listdir(domain_path):
             if file_name.endswith(".json"):
-                file_path = os.path.join(domain_path, file_name)
-                text = process_json_file(file_path)
-                if text.strip():  # only keep non-empty
-                    texts.append(text)
-                    labels.append(label)
-    return texts, labels
+                file_paths.append(os.path.join(domain_path, file_name))
+
+    # tokenizing is cpu-bound, so spread the files across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        processed = executor.map(process_json_file, file_paths, chunksize=64)
+        documents = [tokens for tokens in processed if tokens]  # only keep non-empty
+    return documents, [label] * len(documents)
 
 
 def train(dev_dir, nondev_dir):
-    dev_texts, dev_labels = load_dataset(dev_dir, 1)
-    nondev_texts, nondev_labels = load_dataset(nondev_dir, 0)
+    dev_documents, dev_labels = load_dataset(dev_dir, 1)
+    nondev_documents, nondev_labels = load_dataset(nondev_dir, 0)
 
-    texts = dev_texts + nondev_texts
+    documents = dev_documents + nondev_documents
     labels = dev_labels + nondev_labels
 
-    # Vectorize
-    vectorizer = TfidfVectorizer(
-        max_features=10000,
+    # Vectorize. n-grams are hashed straight into a fixed feature space so the
+    # full (1,3)-gram vocabulary is never held in memory. The hashing
+    # vectorizer only records the featurization settings for the service.
+    hasher = HashingVectorizer(
+        n_features=2**18,
         ngram_range=(1,3),
-        min_df=2,   # ignore words appearing in only 1 doc
-        max_df=0.9, # ignore words appearing in 90% of docs
         stop_words=list(text.ENGLISH_STOP_WORDS),
+        norm=None,
+        alternate_sign=False,
     )
+    counts = count_ngrams(documents, hasher)
+    tfidf = TfidfTransformer().fit(counts)
+    vectorizer = make_pipeline(hasher, tfidf)
 
-    X = vectorizer.fit_transform(texts)
+    X = tfidf.transform(counts)
     y = labels
 
     # Train/test split
@@ -74,12 +102,17 @@ def train(dev_dir, nondev_dir):
     y_pred = clf.predict(X_test)
     print(classification_report(y_test, y_pred))
 
+    # Store weights as float32, the dtype the service scores with, so the
+    # memory-mapped arrays can be used as loaded instead of copied
+    clf.coef_ = clf.coef_.astype(np.float32)
+    tfidf.idf_ = tfidf.idf_.astype(np.float32)
+
     return clf, vectorizer
 
 
 def classify_json(file_path, clf, vectorizer):
-    text = process_json_file(file_path)
-    X_new = vectorizer.transform([text])
+    hasher, tfidf = vectorizer[0], vectorizer[-1]
+    X_new = tfidf.transform(count_ngrams([process_json_file(file_path)], hasher))
     return clf.predict_proba(X_new)[0] # [prob_not_dev, prob_dev]
 
 
@@ -1,10 +1,13 @@
 import os
 import hashlib
+from bisect import bisect_right
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from contextlib import asynccontextmanager
+from itertools import accumulate
 
 import asyncpg
+from cachetools import TTLCache
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
@@ -75,6 +78,55 @@ app.add_middleware(
 )
 
 
+def build_search_queries() -> Dict[tuple, tuple]:
+    """
+    Build the search and count queries for every combination of the optional
+    domain and min_words filters. Reusing the same query text lets asyncpg's
+    per-connection statement cache skip re-preparing them on the server.
+    """
+    select = """
+        SELECT
+            id::text,
+            url,
+            title,
+            description,
+            LEFT(content, 400) AS content,
+            domain,
+            word_count,
+            created_at,
+            ts_rank_cd(search_vector, plainto_tsquery('english', $1)) as rank
+        FROM pages
+        WHERE search_vector @@ plainto_tsquery('english', $1)
+        """
+    count = """
+        SELECT COUNT(*)
+        FROM pages
+        WHERE search_vector @@ plainto_tsquery('english', $1)
+        """
+
+    queries = {}
+    for has_domain in (False, True):
+        for has_min_words in (False, True):
+            filters, param_idx = "", 2
+            if has_domain:
+                filters += f" AND domain = ${param_idx}"
+                param_idx += 1
+            if has_min_words:
+                filters += f" AND word_count >= ${param_idx}"
+                param_idx += 1
+            queries[(has_domain, has_min_words)] = (
+                select + filters + f" ORDER BY rank DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}",
+                count + filters,
+            )
+    return queries
+
+
+SEARCH_QUERIES = build_search_queries()
+
+# match counts drift slowly, so paging through results reuses them briefly
+count_cache = TTLCache(maxsize=4096, ttl=5)
+
+
 def create_content_summary(content: str, max_length: int = 200) -> str:
     """Create a summary of the content, similar to Google search snippets."""
     if not content:
@@ -84,14 +136,11 @@ def create_content_summary(content: str, max_length: int = 200) -> str:
     if len(content) <= max_length:
         return content
 
+    # the summary holds the words whose running length, one separator each,
+    # stays within max_length
     words = content.split()
-    summary = ""
-    for word in words:
-        if len(summary) + len(word) + 1 > max_length:
-            break
-        summary += word + " "
-
-    return summary.strip() + "..."
+    ends = list(accumulate(len(word) + 1 for word in words))
+    return " ".join(words[:bisect_right(ends, max_length)]) + "..."
 
 
 @app.get("/search", response_model=SearchResponse)
@@ -129,62 +178,33 @@ async def search(
         )
 
     offset = (page - 1) * per_page
+    query, count_query = SEARCH_QUERIES[(bool(domain), bool(min_words))]
 
-    async with app.state.db_pool.acquire() as conn:
-        base_query = """
-        SELECT
-            id::text,
-            url,
-            title,
-            description,
-            content,
-            domain,
-            word_count,
-            created_at,
-            ts_rank_cd(search_vector, plainto_tsquery('english', $1)) as rank
-        FROM pages
-        WHERE search_vector @@ plainto_tsquery('english', $1)
-        """
-
-        count_query = """
-        SELECT COUNT(*)
-        FROM pages
-        WHERE search_vector @@ plainto_tsquery('english', $1)
-        """
-
-        params = [q]
-        param_idx = 2
-
-        if domain:
-            base_query += f" AND domain = ${param_idx}"
-            count_query += f" AND domain = ${param_idx}"
-            params.append(domain)
-            param_idx += 1
-
-        if min_words:
-            base_query += f" AND word_count >= ${param_idx}"
-            count_query += f" AND word_count >= ${param_idx}"
-            params.append(min_words)
-            param_idx += 1
-
-        base_query += f" ORDER BY rank DESC LIMIT ${param_idx} OFFSET ${param_idx + 1}"
-        params.extend([per_page, offset])
+    params = [q]
+    if domain:
+        params.append(domain)
+    if min_words:
+        params.append(min_words)
 
+    async with app.state.db_pool.acquire() as conn:
         try:
-            total = await conn.fetchval(count_query, *params[:-2])
-            rows = await conn.fetch(base_query, *params)
+            count_key = (q, domain, min_words)
+            total = count_cache.get(count_key)
+            if total is None:
+                total = count_cache[count_key] = await conn.fetchval(count_query, *params)
+            rows = await conn.fetch(query, *params, per_page, offset)
 
             results = [
                 SearchResult(
-                    id=row['id'],
-                    url=row['url'],
-                    title=row['title'],
-                    description=row['description'],
-                    content_summary=create_content_summary(row['content']),
-                    domain=row['domain'],
-                    word_count=row['word_count'],
-                    created_at=row['created_at'],
-                    rank=float(row['rank'])
+                    id=row[0],
+                    url=row[1],
+                    title=row[2],
+                    description=row[3],
+                    content_summary=create_content_summary(row[4]),
+                    domain=row[5],
+                    word_count=row[6],
+                    created_at=row[7],
+                    rank=float(row[8])
                 )
                 for row in rows
             ]
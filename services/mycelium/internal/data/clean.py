@@ -1,15 +1,16 @@
-import concurrent.futures
-import urllib.request
-import urllib.error
+import asyncio
 import ssl
-import socket
 from urllib.parse import urlparse
 from pathlib import Path
 
+import aiohttp
+
 SEED_FILE = Path("seed.txt")
 WORKING_FILE = Path("seed_working.txt")
 TIMEOUT = 5
-MAX_WORKERS = 50
+MAX_WORKERS = 500
+# HEAD responses that may only mean the server does not allow HEAD
+HEAD_REFUSED = (403, 405, 501)
 
 BROWSER_UA = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -17,22 +18,33 @@ BROWSER_UA = (
     "Chrome/115.0 Safari/537.36"
 )
 
-def try_url(url):
+# Scheme that last worked on each seed hostname itself, shared by all seed
+# entries on that host. Base-domain fallbacks are not recorded.
+WORKING_SCHEME_BY_HOST = {}
+
+# Shared by every connection instead of being rebuilt per request
+SSL_CONTEXT = ssl.create_default_context()
+SSL_CONTEXT.check_hostname = True
+
+async def try_url(session, url):
     """Attempt to open URL; return (success_url, error_str)."""
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": BROWSER_UA}, method="GET")
-        context = ssl.create_default_context()
-        context.check_hostname = True
-        with urllib.request.urlopen(req, timeout=TIMEOUT, context=context):
-            return url, None
-    except urllib.error.HTTPError as e:
-        return None, f"HTTP {e.code}"
-    except urllib.error.URLError as e:
-        return None, f"URL Error: {e.reason}"
-    except ssl.SSLError as e:
-        return None, f"SSL Error: {e}"
-    except socket.timeout:
+        # HEAD skips the body; fall back to GET for servers that refuse it
+        async with session.head(url, allow_redirects=True) as response:
+            status = response.status
+        if status in HEAD_REFUSED:
+            async with session.get(url, allow_redirects=True) as response:
+                status = response.status
+        if status >= 400:
+            return None, f"HTTP {status}"
+        return url, None
+    except asyncio.TimeoutError:
+        # Before ClientConnectionError: aiohttp's timeouts subclass both
         return None, "Timeout"
+    except aiohttp.ClientSSLError as e:
+        return None, f"SSL Error: {e}"
+    except aiohttp.ClientConnectionError as e:
+        return None, f"URL Error: {e}"
     except Exception as e:
         return None, f"{type(e).__name__}: {e}"
 
@@ -42,62 +54,107 @@ def generate_fallbacks(original):
 
     schemes = ["https", "http"] if parsed.scheme == "https" else ["http", "https"]
 
-    # Host variants
+    # Host variants: the host itself, then its base domain if it has a subdomain
     host_variants = []
     if parsed.hostname:
         host_variants.append(parsed.hostname)
-
-    if parsed.hostname and parsed.path not in ("", "/"):
-        host_variants.append(parsed.hostname)  # Root host
-
-    # Remove www. or subdomain to get base domain
-    if parsed.hostname:
         parts = parsed.hostname.split(".")
-        if len(parts) > 2:  # has subdomain
-            base_domain = ".".join(parts[-2:])
-            if base_domain not in host_variants:
-                host_variants.append(base_domain)
+        if len(parts) > 2:
+            host_variants.append(".".join(parts[-2:]))
+    host_variants = list(dict.fromkeys(host_variants))
 
+    # Skip candidates already yielded so no URL is probed twice
+    seen = set()
     for scheme in schemes:
         for host in host_variants:
-            # Full path if host matches original
+            candidates = [f"{scheme}://{host}"]
+            # Full path first if host matches original
             if host == parsed.hostname and parsed.path not in ("", "/"):
-                yield f"{scheme}://{host}{parsed.path}"
-            # Root domain only
-            yield f"{scheme}://{host}"
+                candidates.insert(0, f"{scheme}://{host}{parsed.path}")
+            for candidate in candidates:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                yield candidate
 
-def check_with_fallbacks(url):
+def cached_candidate(url):
+    """Return (hostname, URL to try first with the cached scheme, or None)."""
+    parsed = urlparse(url if "://" in url else "http://" + url)
+    scheme = WORKING_SCHEME_BY_HOST.get(parsed.hostname)
+    if not scheme:
+        return parsed.hostname, None
+    # Same form as the candidates generate_fallbacks yields for this host
+    if parsed.path not in ("", "/"):
+        return parsed.hostname, f"{scheme}://{parsed.hostname}{parsed.path}"
+    return parsed.hostname, f"{scheme}://{parsed.hostname}"
+
+async def find_working(session, url):
     """Try URL and fallbacks; return (working_url, error)."""
     last_error = None
+    # Seeds on the same host usually work over the same scheme
+    host, cached = cached_candidate(url)
+    if cached:
+        working, _ = await try_url(session, cached)
+        if working:
+            return working, None
     for candidate in generate_fallbacks(url):
-        working, error = try_url(candidate)
+        if candidate == cached:
+            continue
+        working, error = await try_url(session, candidate)
         if working:
+            parsed = urlparse(working)
+            if host and parsed.hostname == host:
+                WORKING_SCHEME_BY_HOST[host] = parsed.scheme
             return working, None
         last_error = error
     return None, last_error or "Unknown error"
 
+async def check_with_fallbacks(session, semaphore, url):
+    """Check one seed; return (original_url, working_url, error)."""
+    async with semaphore:
+        # Caught here, where the seed is known; as_completed in check_all
+        # does not say which seed a failed task belonged to
+        try:
+            working, error = await find_working(session, url)
+        except Exception as e:
+            return url, None, f"Unexpected error {type(e).__name__}: {e}"
+    return url, working, error
+
+async def check_all(urls, out):
+    """Check every URL over one pooled session, writing working ones to out."""
+    written = set()
+
+    connector = aiohttp.TCPConnector(
+        limit=MAX_WORKERS, limit_per_host=4, ttl_dns_cache=300, ssl=SSL_CONTEXT
+    )
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers={"User-Agent": BROWSER_UA}
+    ) as session:
+        semaphore = asyncio.Semaphore(MAX_WORKERS)
+        tasks = [check_with_fallbacks(session, semaphore, u) for u in urls]
+        for future in asyncio.as_completed(tasks):
+            original_url, checked_url, error = await future
+            if error is None:
+                # Seeds that fall back to the same URL would otherwise repeat it
+                if checked_url not in written:
+                    written.add(checked_url)
+                    out.write(f"{checked_url}\n")
+            else:
+                print(f"{original_url}: {error}")
+
 def main():
     if not SEED_FILE.exists():
         print(f"Seed file not found: {SEED_FILE}")
         return
 
-    urls = SEED_FILE.read_text().splitlines()
-    working_urls = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(check_with_fallbacks, u): u for u in urls}
-        for future in concurrent.futures.as_completed(futures):
-            original_url = futures[future]
-            try:
-                checked_url, error = future.result()
-                if error is None:
-                    working_urls.append(checked_url)
-                else:
-                    print(f"{original_url}: {error}")
-            except Exception as e:
-                print(f"{original_url}: Unexpected error {type(e).__name__}: {e}")
-
-    WORKING_FILE.write_text("\n".join(working_urls))
+    # Repeated seed lines would only probe the same URLs again
+    urls = list(dict.fromkeys(SEED_FILE.read_text().splitlines()))
+
+    # Line buffered so every result reaches disk as soon as it is known
+    with WORKING_FILE.open("w", buffering=1) as out:
+        asyncio.run(check_all(urls, out))
+
     print(f"\nWorking URLs saved to {WORKING_FILE}")
 
 if __name__ == "__main__":
@@ -5,10 +5,15 @@ import signal
 import sys
 from pathlib import Path
 
+try:
+    import uvloop
+except ImportError:  # uvloop does not support Windows
+    uvloop = None
+
 # Add src directory to Python path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from src.config import settings
+from src.config import get_settings
 from src.indexer import indexer_service
 from dotenv import load_dotenv
 
@@ -16,7 +21,7 @@ from dotenv import load_dotenv
 def setup_logging():
     """Configure logging for the application."""
     logging.basicConfig(
-        level=getattr(logging, settings.log_level.upper()),
+        level=getattr(logging, get_settings().log_level.upper()),
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
             logging.StreamHandler(),
@@ -46,15 +51,20 @@ async def main():
     logger = logging.getLogger(__name__)
     
     logger.info("Starting Taxonomist - Developer Blog Indexer")
+    settings = get_settings()
     logger.info(f"Config: batch_size={settings.batch_size}, max_workers={settings.max_workers}")
     
     try:
         # Initialize the indexer service
         await indexer_service.initialize()
         
-        # Setup graceful shutdown handlers
+        # Setup graceful shutdown handlers on the running loop, which calls
+        # them from loop context where tasks can be scheduled safely
+        loop = asyncio.get_running_loop()
         for sig in [signal.SIGTERM, signal.SIGINT]:
-            signal.signal(sig, lambda s, f: asyncio.create_task(shutdown_handler(indexer_service)))
+            loop.add_signal_handler(
+                sig, lambda: asyncio.create_task(shutdown_handler(indexer_service))
+            )
         
         # Run the indexer
         await indexer_service.run()
@@ -69,4 +79,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # uvloop's libuv loop cuts per-round-trip overhead on the Redis and
+    # Postgres sockets
+    if uvloop:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
@@ -1,10 +1,12 @@
 -- PostgreSQL schema for developer blog indexing
 -- Designed for efficient full-text search and content deduplication
 
--- Main table for indexed blog posts
+-- Main table for indexed blog posts, hash partitioned on url_hash so
+-- concurrent writers spread over separate tables and indexes. Unique keys
+-- must include url_hash; url stays unique because url_hash is its digest.
 CREATE TABLE IF NOT EXISTS pages (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    url VARCHAR(2048) UNIQUE NOT NULL,
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    url VARCHAR(2048) NOT NULL,
     url_hash VARCHAR(64) UNIQUE NOT NULL, -- SHA-256 hash for deduplication
     
     -- Content metadata
@@ -32,8 +34,29 @@ CREATE TABLE IF NOT EXISTS pages (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
     -- Full-text search vector (automatically maintained)
-    search_vector tsvector
-);
+    search_vector tsvector,
+
+    PRIMARY KEY (id, url_hash)
+) PARTITION BY HASH (url_hash);
+
+-- Tables created before partitioning keep working unpartitioned
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'pages'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+
+    FOR i IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS pages_p%s PARTITION OF pages '
+            'FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            i, i
+        );
+    END LOOP;
+END;
+$$;
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_pages_url_hash ON pages (url_hash);
@@ -1,11 +1,9 @@
 """CLI utilities for the taxonomist indexer."""
 import asyncio
-import json
 import sys
 from typing import Optional
 
 from .database import db_manager
-from .config import settings
 
 
 async def search_command(query: str, limit: int = 20) -> None:
@@ -1,35 +1,143 @@
 """Database operations for the taxonomist indexer."""
 import asyncio
 import logging
-from typing import Optional, List, Tuple
+from collections import Counter
+from typing import AsyncIterator, Optional, List, Tuple
 from contextlib import asynccontextmanager
+from pathlib import Path
+from uuid import UUID
 
 import asyncpg
+import orjson
 from asyncpg import Connection, Pool
 
-from .config import settings
+from .config import get_settings
 from .models import IndexedPage, IndexerStats
 
 logger = logging.getLogger(__name__)
 
+# Seconds between writes of buffered statistics to indexer_stats
+STATS_FLUSH_INTERVAL = 5
+
+# Read once at import, next to this package, so startup does no blocking
+# file I/O on the event loop
+SCHEMA_SQL = (Path(__file__).resolve().parent.parent / "schema.sql").read_text()
+
+# Columns written by the indexer; domain and word_count are set by a trigger
+PAGE_COLUMNS = (
+    'url', 'url_hash', 'title', 'description', 'author', 'headings',
+    'content', 'keywords', 'links', 'script_links', 'content_hash', 'created_at'
+)
+
+# Batches at least this large load their new pages with COPY
+COPY_MIN_PAGES = 1024
+
+# Batches at least this large are split across connections, in sub-batches
+# still large enough for COPY
+SHARD_MIN_PAGES = 2 * COPY_MIN_PAGES
+
+# Wide columns that are often unchanged when a page's content changes.
+# Keeping the stored value lets the new row version reuse its TOAST data
+# instead of writing an identical copy.
+SPARSE_UPDATE_COLUMNS = ('description', 'headings', 'keywords', 'links', 'script_links')
+
+# Overwrites an existing page only when its content changed, so unchanged
+# pages produce no row version and no RETURNING row. xmax is 0 on the row
+# version written by a fresh insert. url is left alone since url_hash, the
+# conflict key, is its digest.
+UPSERT_CONFLICT_CLAUSE = """
+    ON CONFLICT (url_hash) DO UPDATE SET
+        title = EXCLUDED.title, author = EXCLUDED.author,
+        content = EXCLUDED.content,
+        content_hash = EXCLUDED.content_hash,
+        created_at = EXCLUDED.created_at,
+        updated_at = NOW(),
+""" + ",\n".join(
+    f"        {column} = CASE WHEN pages.{column} IS DISTINCT FROM EXCLUDED.{column}"
+    f" THEN EXCLUDED.{column} ELSE pages.{column} END"
+    for column in SPARSE_UPDATE_COLUMNS
+) + """
+    WHERE pages.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+"""
+
+# Statement texts are built once so every call sends identical SQL and hits
+# asyncpg's per-connection prepared statement cache, which skips re-parsing
+# and re-planning on the server.
+UPSERT_PAGE_SQL = """
+    INSERT INTO pages (
+        url, url_hash, title, description, author, headings,
+        content, keywords, links, script_links, content_hash, created_at
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+""" + UPSERT_CONFLICT_CLAUSE + """
+    RETURNING (xmax = 0) AS inserted
+"""
+
+UPSERT_PAGES_SQL = """
+    INSERT INTO pages (
+        url, url_hash, title, description, author, headings,
+        content, keywords, links, script_links, content_hash, created_at
+    )
+    SELECT
+        url, url_hash, title, description, author, headings,
+        content, keywords, links, script_links, content_hash, created_at
+    FROM jsonb_to_recordset($1::jsonb) AS r(
+        url TEXT, url_hash TEXT, title TEXT, description TEXT,
+        author TEXT, headings TEXT[], content TEXT, keywords TEXT[],
+        links TEXT[], script_links TEXT[], content_hash TEXT,
+        created_at BIGINT
+    )
+""" + UPSERT_CONFLICT_CLAUSE + """
+    RETURNING url_hash, (xmax = 0) AS inserted
+"""
+
+# The tsquery is parsed once in FROM and shared by the match and the ranking.
+# A NULL limit ($2) returns every match.
+SEARCH_PAGES_SQL = """
+    SELECT * FROM (
+        SELECT id, url, title, description, author, domain,
+               word_count, created_at,
+               ts_rank_cd(search_vector, q.tsq) as rank
+        FROM pages, plainto_tsquery('english', $1) AS q(tsq)
+        WHERE search_vector @@ q.tsq
+    ) ranked
+    WHERE $3::real IS NULL
+       OR (rank, created_at, id) < ($3::real, $4::bigint, $5::uuid)
+    ORDER BY rank DESC, created_at DESC, id DESC
+    LIMIT $2::bigint
+"""
+
 
 class DatabaseManager:
     """Manages PostgreSQL database connections and operations."""
 
     def __init__(self):
         self.pool: Optional[Pool] = None
+        # Statistics recorded since the last flush to indexer_stats
+        self._pending_stats: Counter = Counter()
+        self._stats_flusher: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
 
     async def initialize(self) -> None:
         """Initialize the database connection pool."""
+        settings = get_settings()
         try:
             self.pool = await asyncpg.create_pool(
                 settings.postgres_url,
-                min_size=2,
+                # Keep a connection per worker open so bursts never wait on
+                # connection setup; close extras after five idle minutes
+                min_size=settings.max_workers,
                 max_size=settings.max_workers * 2,
+                max_inactive_connection_lifetime=300,
+                # The indexer runs a small fixed set of statements, so keep
+                # them prepared for the life of the connection instead of
+                # re-preparing any that sat unused for five minutes
+                statement_cache_size=1024,
+                max_cached_statement_lifetime=0,
                 command_timeout=60,
                 server_settings={
                     'application_name': 'taxonomist-indexer'
-                }
+                },
+                init=self._init_connection
             )
             logger.info("Database pool initialized successfully")
 
@@ -37,13 +145,36 @@ class DatabaseManager:
             async with self.get_connection() as conn:
                 await self.ensure_schema(conn)
 
+            self._closing.clear()
+            self._stats_flusher = asyncio.create_task(self._flush_stats_periodically())
+
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
             raise
 
+    @staticmethod
+    async def _init_connection(conn: Connection) -> None:
+        """Set up a new pool connection."""
+        # Exchange jsonb in binary format, serialized by orjson: a version
+        # byte followed by the JSON text
+        await conn.set_type_codec(
+            'jsonb',
+            encoder=lambda value: b'\x01' + orjson.dumps(value),
+            decoder=lambda data: orjson.loads(data[1:]),
+            schema='pg_catalog',
+            format='binary'
+        )
+
     async def close(self) -> None:
         """Close the database connection pool."""
+        # Let a flush already in progress finish rather than cancelling it
+        self._closing.set()
+        if self._stats_flusher:
+            await self._stats_flusher
+            self._stats_flusher = None
+
         if self.pool:
+            await self.flush_stats()
             await self.pool.close()
             logger.info("Database pool closed")
 
@@ -59,12 +190,7 @@ class DatabaseManager:
     async def ensure_schema(self, conn: Connection) -> None:
         """Ensure database schema is up to date."""
         try:
-            # Read and execute schema file
-            schema_path = "/Users/ppanda/Code/yuzhoumo/cozynet/taxonomist/schema.sql"
-            with open(schema_path, 'r') as f:
-                schema_sql = f.read()
-
-            await conn.execute(schema_sql)
+            await conn.execute(SCHEMA_SQL)
             logger.info("Database schema updated successfully")
 
         except Exception as e:
@@ -77,72 +203,161 @@ class DatabaseManager:
         Returns: 'inserted', 'updated', or 'skipped'
         """
         try:
-            # Check if page already exists by URL hash
-            existing = await conn.fetchrow(
-                "SELECT id, content_hash FROM pages WHERE url_hash = $1",
-                page.url_hash
+            # No row comes back when the page exists with unchanged content
+            row = await conn.fetchrow(
+                UPSERT_PAGE_SQL,
+                page.url, page.url_hash, page.title, page.description,
+                page.author, page.headings, page.content, page.keywords,
+                page.links, page.script_links, page.content_hash, page.created_at
             )
 
-            if existing:
-                # Skip if content hasn't changed
-                if existing['content_hash'] == page.content_hash:
-                    return 'skipped'
+            if row is None:
+                return 'skipped'
+            return 'inserted' if row['inserted'] else 'updated'
 
-                # Update existing page
-                await conn.execute("""
-                    UPDATE pages SET
-                        url = $2, title = $3, description = $4, author = $5,
-                        headings = $6, content = $7, keywords = $8, links = $9,
-                        script_links = $10, content_hash = $11, created_at = $12,
-                        updated_at = NOW()
-                    WHERE url_hash = $1
-                """,
-                    page.url_hash, page.url, page.title, page.description,
-                    page.author, page.headings, page.content, page.keywords,
-                    page.links, page.script_links, page.content_hash, page.created_at
-                )
-                return 'updated'
+        except Exception as e:
+            logger.error(f"Failed to insert/update page {page.url}: {e}")
+            raise
 
-            else:
-                # Insert new page
-                await conn.execute("""
-                    INSERT INTO pages (
-                        url, url_hash, title, description, author, headings,
-                        content, keywords, links, script_links, content_hash, created_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                """,
-                    page.url, page.url_hash, page.title, page.description,
-                    page.author, page.headings, page.content, page.keywords,
-                    page.links, page.script_links, page.content_hash, page.created_at
+    async def insert_or_update_pages(
+        self,
+        conn: Connection,
+        pages: List[IndexedPage]
+    ) -> List[str]:
+        """
+        Insert or update a batch of pages with a single statement.
+        Returns: 'inserted', 'updated', or 'skipped' for each page, in order
+        """
+        # One statement cannot upsert the same row twice, so only the last
+        # copy of a repeated URL is written; earlier copies count as skipped
+        latest = {page.url_hash: page for page in pages}
+        written = {}
+
+        try:
+            # Re-crawled pages are mostly unchanged: compare content hashes
+            # first so those pages' content is never sent
+            existing = await self._lookup_existing(conn, list(latest))
+            remaining = [
+                page for page in latest.values()
+                if existing.get(page.url_hash) != page.content_hash
+            ]
+
+            if len(remaining) >= COPY_MIN_PAGES:
+                copied, remaining = await self._copy_new_pages(conn, remaining, existing)
+                written.update(dict.fromkeys(copied, 'inserted'))
+
+            if remaining:
+                records = [page.model_dump(include=PAGE_COLUMNS) for page in remaining]
+                rows = await conn.fetch(UPSERT_PAGES_SQL, records)
+                written.update(
+                    (row['url_hash'], 'inserted' if row['inserted'] else 'updated')
+                    for row in rows
                 )
-                return 'inserted'
 
         except Exception as e:
-            logger.error(f"Failed to insert/update page {page.url}: {e}")
+            logger.error(f"Failed to insert/update {len(pages)} pages: {e}")
             raise
 
+        return [
+            written.get(page.url_hash, 'skipped') if latest[page.url_hash] is page
+            else 'skipped'
+            for page in pages
+        ]
+
+    async def _lookup_existing(
+        self,
+        conn: Connection,
+        url_hashes: List[str]
+    ) -> dict:
+        """
+        Look up stored pages by URL hash in one query.
+        Returns: {url_hash: content_hash} for the pages that exist
+        """
+        rows = await conn.fetch(
+            "SELECT url_hash, content_hash FROM pages WHERE url_hash = ANY($1::text[])",
+            url_hashes
+        )
+        return {row[0]: row[1] for row in rows}
+
+    async def _copy_new_pages(
+        self,
+        conn: Connection,
+        pages: List[IndexedPage],
+        existing: dict
+    ) -> Tuple[List[str], List[IndexedPage]]:
+        """
+        Load the pages that are not in existing with COPY, which skips the
+        per-row conflict handling of the upsert.
+        Returns: (url hashes of the copied pages, stored pages left to upsert)
+        """
+        new_pages = [page for page in pages if page.url_hash not in existing]
+        changed = [page for page in pages if page.url_hash in existing]
+        if not new_pages:
+            return [], changed
+
+        try:
+            # A savepoint when called inside a transaction, so a failed COPY
+            # does not abort it
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    'pages',
+                    records=[
+                        tuple(getattr(page, column) for column in PAGE_COLUMNS)
+                        for page in new_pages
+                    ],
+                    columns=PAGE_COLUMNS
+                )
+        except asyncpg.UniqueViolationError:
+            # Another worker stored some of these pages after the lookup
+            return [], new_pages + changed
+
+        return [page.url_hash for page in new_pages], changed
+
     async def batch_insert_or_update(
         self,
-        pages: List[IndexedPage]
+        pages: List[IndexedPage],
+        concurrency: Optional[int] = None
     ) -> Tuple[int, int, int]:
         """
-        Insert or update multiple pages in a transaction.
+        Insert or update multiple pages. Batches of SHARD_MIN_PAGES or more,
+        or any batch when concurrency is given, are split by url_hash into
+        sub-batches that are written concurrently on separate connections.
         Returns: (inserted_count, updated_count, skipped_count)
         """
-        inserted = updated = skipped = 0
-
+        if not pages:
+            return 0, 0, 0
+
+        if concurrency is None:
+            concurrency = 1
+            if len(pages) >= SHARD_MIN_PAGES:
+                concurrency = min(get_settings().max_workers, len(pages) // COPY_MIN_PAGES)
+        concurrency = min(concurrency, len(pages))
+        if concurrency <= 1:
+            results = await self._flush_chunk(pages)
+            return results['inserted'], results['updated'], results['skipped']
+
+        # Sharding on url_hash keeps repeats of a URL in the same sub-batch
+        chunks = [[] for _ in range(concurrency)]
+        for page in pages:
+            chunks[hash(page.url_hash) % concurrency].append(page)
+
+        results = Counter()
+        for chunk_results in await asyncio.gather(
+            *(self._flush_chunk(chunk) for chunk in chunks if chunk)
+        ):
+            results.update(chunk_results)
+
+        return results['inserted'], results['updated'], results['skipped']
+
+    async def _flush_chunk(self, pages: List[IndexedPage]) -> Counter:
+        """
+        Write one sub-batch on its own connection and count the outcomes.
+        Each statement runs in its own implicit transaction, which keeps
+        snapshots short; a page changed by another worker between the lookup
+        and the upsert is still caught by the upsert's conflict handling.
+        """
         async with self.get_connection() as conn:
-            async with conn.transaction():
-                for page in pages:
-                    result = await self.insert_or_update_page(conn, page)
-                    if result == 'inserted':
-                        inserted += 1
-                    elif result == 'updated':
-                        updated += 1
-                    elif result == 'skipped':
-                        skipped += 1
-
-        return inserted, updated, skipped
+            return Counter(await self.insert_or_update_pages(conn, pages))
 
     async def update_stats(
         self,
@@ -153,29 +368,79 @@ class DatabaseManager:
         errors: int = 0,
         processing_time_ms: Optional[float] = None
     ) -> None:
-        """Update indexer statistics."""
+        """
+        Record indexer statistics. They are written to the database by
+        flush_stats, which runs every STATS_FLUSH_INTERVAL seconds.
+        """
+        self._pending_stats.update(
+            processed=processed,
+            inserted=inserted,
+            updated=updated,
+            skipped=skipped,
+            errors=errors
+        )
+        if processing_time_ms is not None:
+            self._pending_stats.update(time_ms=processing_time_ms, timed=1)
+
+    async def flush_stats(self) -> None:
+        """Write the statistics recorded since the last flush."""
+        # Swap before awaiting so updates made during the write are kept
+        pending, self._pending_stats = self._pending_stats, Counter()
+        if not pending:
+            return
+
+        # Batches flushed together count as one timing sample
+        processing_time_ms = pending['time_ms'] / pending['timed'] if pending['timed'] else None
+
         try:
             async with self.get_connection() as conn:
                 await conn.execute("""
                     SELECT update_indexer_stats($1, $2, $3, $4, $5, $6)
-                """, processed, inserted, updated, skipped, errors, processing_time_ms)
+                """,
+                    pending['processed'], pending['inserted'], pending['updated'],
+                    pending['skipped'], pending['errors'], processing_time_ms
+                )
 
+        except asyncio.CancelledError:
+            self._pending_stats.update(pending)
+            raise
         except Exception as e:
+            # Keep the statistics for the next flush
+            self._pending_stats.update(pending)
             logger.error(f"Failed to update stats: {e}")
 
+    async def _flush_stats_periodically(self) -> None:
+        """Flush statistics every STATS_FLUSH_INTERVAL seconds until close."""
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), STATS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.flush_stats()
+
     async def get_stats(self) -> Optional[IndexerStats]:
         """Get current day's indexer statistics."""
+        await self.flush_stats()
         try:
             async with self.get_connection() as conn:
                 row = await conn.fetchrow("""
                     SELECT pages_processed, pages_inserted, pages_updated,
-                           pages_skipped, processing_errors, avg_processing_time_ms
+                           pages_skipped, processing_errors,
+                           avg_processing_time_ms::float8
                     FROM indexer_stats
                     WHERE date = CURRENT_DATE
                 """)
 
                 if row:
-                    return IndexerStats(**dict(row))
+                    # Columns already have the model's types, so skip
+                    # validation and the intermediate dict
+                    return IndexerStats.model_construct(
+                        pages_processed=row[0],
+                        pages_inserted=row[1],
+                        pages_updated=row[2],
+                        pages_skipped=row[3],
+                        processing_errors=row[4],
+                        avg_processing_time_ms=row[5]
+                    )
                 return IndexerStats()
 
         except Exception as e:
@@ -183,10 +448,29 @@ class DatabaseManager:
             return None
 
     async def get_page_count(self) -> int:
-        """Get total number of indexed pages."""
+        """
+        Get the approximate number of indexed pages from the planner's
+        estimate, which autovacuum keeps current, instead of scanning the
+        whole table. A partitioned parent has no estimate of its own, so the
+        partitions' estimates are summed; tables created before partitioning
+        have no partitions and use their own.
+        """
         try:
             async with self.get_connection() as conn:
-                count = await conn.fetchval("SELECT COUNT(*) FROM pages")
+                count = await conn.fetchval("""
+                    SELECT COALESCE(
+                        (SELECT CASE WHEN bool_or(c.reltuples < 0) THEN -1
+                                     ELSE SUM(c.reltuples) END
+                         FROM pg_inherits i
+                         JOIN pg_class c ON c.oid = i.inhrelid
+                         WHERE i.inhparent = 'pages'::regclass),
+                        (SELECT reltuples FROM pg_class WHERE oid = 'pages'::regclass)
+                    )::bigint
+                """)
+                # -1 until the table, or any partition, is first vacuumed or
+                # analyzed
+                if count is None or count < 0:
+                    count = await conn.fetchval("SELECT COUNT(*) FROM pages")
                 return count or 0
 
         except Exception as e:
@@ -197,20 +481,24 @@ class DatabaseManager:
         self,
         query: str,
         limit: int = 20,
-        offset: int = 0
+        cursor: Optional[Tuple[float, int, UUID]] = None
     ) -> List[dict]:
-        """Search pages using full-text search."""
+        """
+        Search pages using full-text search.
+        Pass the (rank, created_at, id) of the last result as cursor to get
+        the next page; unlike OFFSET, this does not rank and discard every
+        earlier result again.
+        """
+        # A blank query matches nothing, so skip the round-trip
+        if not query.strip():
+            return []
+
+        rank, created_at, page_id = cursor or (None, None, None)
         try:
             async with self.get_connection() as conn:
-                rows = await conn.fetch("""
-                    SELECT id, url, title, description, author, domain,
-                           word_count, created_at,
-                           ts_rank_cd(search_vector, plainto_tsquery('english', $1)) as rank
-                    FROM pages
-                    WHERE search_vector @@ plainto_tsquery('english', $1)
-                    ORDER BY rank DESC, created_at DESC
-                    LIMIT $2 OFFSET $3
-                """, query, limit, offset)
+                rows = await conn.fetch(
+                    SEARCH_PAGES_SQL, query, limit, rank, created_at, page_id
+                )
 
                 return [dict(row) for row in rows]
 
@@ -218,6 +506,34 @@ class DatabaseManager:
             logger.error(f"Failed to search pages: {e}")
             return []
 
+    async def search_pages_stream(
+        self,
+        query: str,
+        batch: int = 200,
+        cursor: Optional[Tuple[float, int, UUID]] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Yield every page matching query, in search_pages order, through a
+        server-side cursor that fetches batch rows at a time. Memory stays
+        bounded however many pages match.
+        """
+        if not query.strip():
+            return
+
+        rank, created_at, page_id = cursor or (None, None, None)
+        try:
+            async with self.get_connection() as conn:
+                # Server-side cursors only live inside a transaction
+                async with conn.transaction(readonly=True):
+                    async for row in conn.cursor(
+                        SEARCH_PAGES_SQL, query, None, rank, created_at, page_id,
+                        prefetch=batch
+                    ):
+                        yield dict(row)
+
+        except Exception as e:
+            logger.error(f"Failed to stream search results: {e}")
+
 
 # Global database manager instance
 db_manager = DatabaseManager()
@@ -1,16 +1,14 @@
 """Core indexer service for processing the taxonomist Redis queue."""
 import asyncio
-import json
 import logging
 import time
-from typing import List, Optional
-from contextlib import asynccontextmanager
+from typing import List, Optional, Union
 
+import msgspec
 import redis.asyncio as redis
-from pydantic import ValidationError
 
-from .config import settings
-from .models import Page, IndexedPage
+from .config import get_settings
+from .models import Page, IndexedPage, PAGE_DECODER
 from .database import db_manager
 
 logger = logging.getLogger(__name__)
@@ -34,7 +32,7 @@ class IndexerService:
         """Initialize Redis connection and database."""
         try:
             # Initialize Redis client
-            self.redis_client = redis.from_url(settings.redis_url)
+            self.redis_client = redis.from_url(get_settings().redis_url)
             await self.redis_client.ping()
             logger.info("Redis connection established")
 
@@ -57,17 +55,13 @@ class IndexerService:
         await db_manager.close()
         logger.info("Indexer service closed")
 
-    @asynccontextmanager
-    async def get_redis_client(self):
-        """Get Redis client with connection handling."""
-        if not self.redis_client:
-            raise RuntimeError("Redis client not initialized")
-        yield self.redis_client
-
     def is_valid_page(self, page: Page) -> bool:
         """Validate if a page should be indexed."""
-        content_text = page.get_content_text()
-        content_length = len(content_text)
+        settings = get_settings()
+
+        # Length of the joined content, without joining it for pages that
+        # are about to be skipped
+        content_length = sum(map(len, page.content)) + max(len(page.content) - 1, 0)
 
         # Check content length constraints
         if content_length < settings.min_content_length:
@@ -79,76 +73,79 @@ class IndexerService:
             return False
 
         # Check for required fields
-        if not page.title and not content_text.strip():
+        if not page.title and all(not c or c.isspace() for c in page.content):
             logger.debug(f"Skipping page {page.location}: no title or content")
             return False
 
         return True
 
-    async def process_page(self, page_data: dict) -> str:
+    def prepare_page(self, page_data: bytes, now: int) -> Union[IndexedPage, str]:
         """
-        Process a single page from the queue.
-        Returns: 'inserted', 'updated', 'skipped', or 'error'
+        Validate a page from the queue and convert it for storage,
+        using now as the created_at of pages without one.
+        Returns: the IndexedPage to store, or 'skipped' or 'error'
         """
         try:
             # Parse and validate page data
-            page = Page(**page_data)
+            page = PAGE_DECODER.decode(page_data)
 
             # Validate page content
             if not self.is_valid_page(page):
                 return 'skipped'
 
             # Convert to indexed page model
-            indexed_page = IndexedPage.from_page(page)
+            return IndexedPage.from_page(page, now)
 
-            # Insert or update in database
-            async with db_manager.get_connection() as conn:
-                result = await db_manager.insert_or_update_page(conn, indexed_page)
-                logger.debug(f"Page {page.location} - {result}")
-                return result
-
-        except ValidationError as e:
+        except msgspec.DecodeError as e:
             logger.error(f"Invalid page data: {e}")
             return 'error'
         except Exception as e:
             logger.error(f"Failed to process page: {e}")
             return 'error'
 
-    async def process_batch(self, batch: List[dict]) -> None:
+    async def process_batch(self, batch: List[bytes]) -> None:
         """Process a batch of pages."""
         start_time = time.time()
 
         try:
-            # Process pages concurrently
-            tasks = [self.process_page(page_data) for page_data in batch]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Validate pages one by one, then store the valid ones together
+            now = int(start_time)
+            results = [self.prepare_page(page_data, now) for page_data in batch]
+            pages = [r for r in results if isinstance(r, IndexedPage)]
 
             # Count results
+            counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'error': 0}
             for result in results:
-                if isinstance(result, Exception):
-                    self._stats['errors'] += 1
-                    logger.error(f"Batch processing error: {result}")
+                if not isinstance(result, IndexedPage):
+                    counts[result] += 1
+
+            if pages:
+                try:
+                    stored = await db_manager.batch_insert_or_update(pages)
+                except Exception as e:
+                    logger.error(f"Failed to store pages: {e}")
+                    counts['error'] += len(pages)
                 else:
-                    self._stats['processed'] += 1
-                    if result == 'inserted':
-                        self._stats['inserted'] += 1
-                    elif result == 'updated':
-                        self._stats['updated'] += 1
-                    elif result == 'skipped':
-                        self._stats['skipped'] += 1
-                    elif result == 'error':
-                        self._stats['errors'] += 1
+                    counts['inserted'] += stored[0]
+                    counts['updated'] += stored[1]
+                    counts['skipped'] += stored[2]
+
+            self._stats['processed'] += len(results)
+            self._stats['inserted'] += counts['inserted']
+            self._stats['updated'] += counts['updated']
+            self._stats['skipped'] += counts['skipped']
+            self._stats['errors'] += counts['error']
 
             # Calculate processing time
             processing_time = (time.time() - start_time) * 1000
 
             # Update statistics
             await db_manager.update_stats(
-                processed=len([r for r in results if not isinstance(r, Exception)]),
-                inserted=len([r for r in results if r == 'inserted']),
-                updated=len([r for r in results if r == 'updated']),
-                skipped=len([r for r in results if r == 'skipped']),
-                errors=len([r for r in results if isinstance(r, Exception) or r == 'error']),
+                processed=len(results),
+                inserted=counts['inserted'],
+                updated=counts['updated'],
+                skipped=counts['skipped'],
+                errors=counts['error'],
                 processing_time_ms=processing_time
             )
 
@@ -158,52 +155,31 @@ class IndexerService:
             logger.error(f"Batch processing failed: {e}")
             self._stats['errors'] += len(batch)
 
-    async def get_queue_item(self) -> Optional[dict]:
-        """Get a single item from the Redis queue."""
+    async def get_batch(self) -> List[bytes]:
+        """Get a batch of items from the Redis queue."""
+        settings = get_settings()
+        key = settings.redis_taxonomist_queue_key
+
         try:
-            async with self.get_redis_client() as redis_client:
-                # Use blocking pop with timeout
-                result = await redis_client.blpop(
-                    settings.redis_taxonomist_queue_key,
-                    timeout=settings.queue_timeout
-                )
-
-                if result:
-                    queue_name, item_data = result
-                    return json.loads(item_data)
-                return None
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in queue: {e}")
-            return None
+            # Take up to a whole batch in one round-trip
+            items = await self.redis_client.lpop(key, settings.batch_size)
+
+            if not items:
+                # Queue is empty: block for the first item, then take
+                # whatever else arrived with it
+                result = await self.redis_client.blpop(key, timeout=settings.queue_timeout)
+                if not result:
+                    return []
+                items = [result[1]]
+                if settings.batch_size > 1:
+                    items += await self.redis_client.lpop(key, settings.batch_size - 1) or []
+
         except Exception as e:
-            logger.error(f"Failed to get queue item: {e}")
-            return None
+            logger.error(f"Failed to get queue items: {e}")
+            return []
 
-    async def get_batch(self) -> List[dict]:
-        """Get a batch of items from the Redis queue."""
-        batch = []
-
-        # Get first item (blocking)
-        first_item = await self.get_queue_item()
-        if first_item:
-            batch.append(first_item)
-
-        # Get additional items for batch (non-blocking)
-        for _ in range(settings.batch_size - 1):
-            try:
-                async with self.get_redis_client() as redis_client:
-                    result = await redis_client.lpop(settings.redis_taxonomist_queue_key)
-                    if result:
-                        item_data = json.loads(result)
-                        batch.append(item_data)
-                    else:
-                        break
-            except (json.JSONDecodeError, Exception) as e:
-                logger.error(f"Error getting batch item: {e}")
-                break
-
-        return batch
+        # Items are decoded and validated together in prepare_page
+        return items
 
     async def log_stats(self) -> None:
         """Log current processing statistics."""
@@ -231,6 +207,9 @@ class IndexerService:
 
     async def run(self) -> None:
         """Main indexer loop."""
+        if not self.redis_client:
+            raise RuntimeError("Redis client not initialized")
+
         self.running = True
         logger.info("Starting indexer service...")
 
@@ -1,63 +1,91 @@
 """Data models for the taxonomist indexer."""
 import hashlib
-from typing import List, Optional
-from pydantic import BaseModel, Field, validator
+import re
+import time
+from functools import cached_property
+from typing import List, Optional, Union
 
+import msgspec
+from pydantic import BaseModel, Field
 
-class Page(BaseModel):
+# Everything between the scheme and the first slash of a page location
+_DOMAIN_RE = re.compile(r'^https?://([^/]*)')
+
+
+# dict=True gives instances the __dict__ that cached_property stores into
+class Page(msgspec.Struct, kw_only=True, dict=True):
     """Model for a crawled page from the taxonomist_queue."""
     title: Optional[str] = None
     description: Optional[str] = None
     author: Optional[str] = None
-    keywords: List[str] = Field(default_factory=list)
-    headings: List[str] = Field(default_factory=list)
-    content: List[str] = Field(default_factory=list)
-    links: List[str] = Field(default_factory=list)
-    script_links: List[str] = Field(default_factory=list)
-    script_content: List[str] = Field(default_factory=list)
+    keywords: Optional[List[str]] = msgspec.field(default_factory=list)
+    headings: Optional[List[str]] = msgspec.field(default_factory=list)
+    content: Union[List[str], str, None] = msgspec.field(default_factory=list)
+    links: Optional[List[str]] = msgspec.field(default_factory=list)
+    script_links: Optional[List[str]] = msgspec.field(default_factory=list)
+    script_content: Optional[List[str]] = msgspec.field(default_factory=list)
     location: str
     created_at: Optional[int] = None
 
-    @validator('content', pre=True)
-    def ensure_content_list(cls, v):
-        """Ensure content is a list."""
-        if isinstance(v, str):
-            return [v]
-        return v or []
-
-    @validator('keywords', 'headings', 'links', 'script_links', 'script_content', pre=True)
-    def ensure_list_fields(cls, v):
-        """Ensure list fields are always lists, never None."""
-        return v or []
-
-    @validator('location')
-    def validate_url(cls, v):
-        """Basic URL validation."""
-        if not v or not v.startswith(('http://', 'https://')):
+    def __post_init__(self):
+        """Normalize list fields and validate the URL."""
+        # Content may arrive as a single string
+        if isinstance(self.content, str):
+            self.content = [self.content]
+
+        # Ensure list fields are always lists, never None
+        self.content = self.content or []
+        self.keywords = self.keywords or []
+        self.headings = self.headings or []
+        self.links = self.links or []
+        self.script_links = self.script_links or []
+        self.script_content = self.script_content or []
+
+        # Basic URL validation; msgspec reports this as a ValidationError
+        if not self.location.startswith(('http://', 'https://')):
             raise ValueError('Invalid URL format')
-        return v
 
-    def get_url_hash(self) -> str:
+    @cached_property
+    def url_hash(self) -> str:
         """Generate SHA-256 hash of the URL."""
         return hashlib.sha256(self.location.encode()).hexdigest()
 
-    def get_content_hash(self) -> str:
+    @cached_property
+    def content_hash(self) -> str:
         """Generate SHA-256 hash of the normalized content."""
-        content_text = ' '.join(self.content).lower().strip()
         title_text = (self.title or '').lower().strip()
-        combined = f"{title_text} {content_text}"
-        return hashlib.sha256(combined.encode()).hexdigest()
+        digest = hashlib.sha256(f"{title_text} ".encode())
+
+        # Hash ' '.join(self.content).lower().strip() chunk by chunk rather
+        # than building it; blank chunks at either end vanish in the strip
+        blank = [not chunk or chunk.isspace() for chunk in self.content]
+        if False in blank:
+            first = blank.index(False)
+            last = len(blank) - 1 - blank[::-1].index(False)
+            for i in range(first, last + 1):
+                chunk = self.content[i].lower()
+                if i == first:
+                    chunk = chunk.lstrip()
+                else:
+                    digest.update(b' ')
+                if i == last:
+                    chunk = chunk.rstrip()
+                digest.update(chunk.encode())
+        return digest.hexdigest()
 
-    def get_content_text(self) -> str:
+    @cached_property
+    def content_text(self) -> str:
         """Get concatenated content as a single string."""
         return ' '.join(self.content)
 
     def extract_domain(self) -> str:
         """Extract domain from URL."""
-        import re
-        domain = re.sub(r'^https?://', '', self.location)
-        domain = re.sub(r'/.*$', '', domain)
-        return domain
+        match = _DOMAIN_RE.match(self.location)
+        return match.group(1) if match else self.location.split('/', 1)[0]
+
+
+# Decodes and validates queue items in one pass
+PAGE_DECODER = msgspec.json.Decoder(Page)
 
 
 class IndexedPage(BaseModel):
@@ -75,27 +103,28 @@ class IndexedPage(BaseModel):
     script_links: List[str] = Field(default_factory=list)
     domain: str
     content_hash: str
-    word_count: int = 0
     created_at: Optional[int] = None
 
     @classmethod
-    def from_page(cls, page: Page) -> 'IndexedPage':
-        """Create IndexedPage from crawled Page."""
-        import time
+    def from_page(cls, page: Page, now: Optional[int] = None) -> 'IndexedPage':
+        """
+        Create IndexedPage from crawled Page. Pages without a crawl time
+        get now, or the current time if now is not given.
+        """
         return cls(
             url=page.location,
-            url_hash=page.get_url_hash(),
+            url_hash=page.url_hash,
             title=page.title,
             description=page.description,
             author=page.author,
             headings=page.headings,
-            content=page.get_content_text(),
+            content=page.content_text,
             keywords=page.keywords,
             links=page.links,
             script_links=page.script_links,
             domain=page.extract_domain(),
-            content_hash=page.get_content_hash(),
-            created_at=page.created_at or int(time.time())
+            content_hash=page.content_hash,
+            created_at=page.created_at or now or int(time.time())
         )
 
 